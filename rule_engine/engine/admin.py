@@ -1,9 +1,47 @@
 from django.contrib import admin
 
 # Register your models here.
+from django import forms
 from django.contrib import admin
-from .models import Rule
+from django.db import transaction
+from .models import Rule, RuleVersion
+from .rules import ast_to_json, build_ast, validate_rule_string
+
+class RuleAdminForm(forms.ModelForm):
+    class Meta:
+        model = Rule
+        fields = ('rule_name', 'rule_string')
+
+    def clean_rule_string(self):
+        rule_string = self.cleaned_data['rule_string']
+        try:
+            validate_rule_string(rule_string)
+        except ValueError as e:
+            raise forms.ValidationError(f"Invalid rule string: {e}")
+        return rule_string
 
 @admin.register(Rule)
 class RuleAdmin(admin.ModelAdmin):
-    list_display = ('rule_name', 'rule_string', 'created_at')
+    form = RuleAdminForm
+    list_display = ('rule_name', 'rule_string', 'version', 'shadow_version', 'created_at')
+    # The AST and version are derived from rule_string; edits go through add_version like EditRuleView
+    readonly_fields = ('ast_json', 'version', 'shadow_version')
+
+    def save_model(self, request, obj, form, change):
+        if change and 'rule_string' not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+
+        with transaction.atomic():
+            if change:
+                Rule.objects.select_for_update().get(pk=obj.pk)  # Serialize with concurrent edits
+            obj.ast_json = ast_to_json(build_ast(obj.rule_string))
+            super().save_model(request, obj, form, change)
+            # A new version number also gives the rule a fresh entry in the compiled-rule cache
+            obj.version = obj.add_version(obj.rule_string, obj.ast_json).version
+            obj.shadow_version = None
+            obj.save(update_fields=['version', 'shadow_version'])
+
+@admin.register(RuleVersion)
+class RuleVersionAdmin(admin.ModelAdmin):
+    list_display = ('rule', 'version', 'rule_string', 'created_at')
+    readonly_fields = ('rule', 'version', 'rule_string', 'ast_json')  # Stored versions are history
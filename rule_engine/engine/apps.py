@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'engine'
+
+    def ready(self):
+        from . import signals  # noqa: F401  # Register the connection_created handler
@@ -14,6 +14,16 @@ class Node:
         self.right = right  # Right child node (another Node)
 
     def __str__(self):
-        if self.type == 'operator':
-            return f"({str(self.left)} {self.value} {str(self.right)})"
-        return f"{self.value}"
+        # Built with an explicit stack so very deep trees cannot hit the recursion limit
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)  # Parenthesis or operator text
+            elif node.type == 'operator':
+                # Pushed in reverse so they pop as "(left OP right)"
+                stack.extend([")", node.right, f" {node.value} ", node.left, "("])
+            else:
+                parts.append(f"{node.value}")
+        return "".join(parts)
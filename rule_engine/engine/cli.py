@@ -0,0 +1,113 @@
+# engine/cli.py
+"""
+Evaluation-only entry point for batch jobs.
+
+Loads rules from a JSON snapshot (written by `python manage.py export_rules`) or
+from the database, compiles them once and evaluates every JSON record read
+from stdin (one object per line), printing one JSON line of results per record:
+
+    python -m engine.cli --snapshot rules.json < records.jsonl
+    python -m engine.cli --from-db --rule "Rule 1" --data '{"age": 35}'
+
+Django is only imported for --from-db, so snapshot jobs start without django.setup().
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+
+from .rules import build_ast, compile_rule
+
+# Cold start (imports, loading and compiling rules) must stay under this budget
+COLD_START_BUDGET_MS = 250
+
+
+def load_snapshot(path):
+    """Reads the rule list written by the export_rules management command."""
+    with open(path) as snapshot:
+        return json.load(snapshot)
+
+
+def load_from_db():
+    """Reads rules through the Django ORM; Django is imported and set up only here."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rule_engine.settings')
+    import django
+    django.setup()
+    from .models import Rule
+
+    return list(Rule.objects.values('rule_name', 'rule_string', 'ast_json'))
+
+
+def compile_rules(rules, names=None):
+    """Compiles each rule once, building the AST from the rule string when none was stored."""
+    compiled = {}
+    for rule in rules:
+        if names and rule['rule_name'] not in names:
+            continue
+        ast_json = rule.get('ast_json') or build_ast(rule['rule_string'])
+        compiled[rule['rule_name']] = compile_rule(ast_json)
+    return compiled
+
+
+def evaluate_record(compiled, data):
+    """Evaluates every compiled rule against one record; type errors are reported per rule."""
+    results = {}
+    for rule_name, kernel in compiled.items():
+        try:
+            results[rule_name] = kernel(data)
+        except ValueError as e:
+            results[rule_name] = {"error": str(e)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate rules against JSON records.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--snapshot', help='JSON rule snapshot written by `manage.py export_rules`.')
+    source.add_argument('--from-db', action='store_true', help='Load rules from the Django database.')
+    parser.add_argument('--rule', action='append', dest='rules', help='Only evaluate this rule (repeatable).')
+    parser.add_argument('--data', help='A single JSON record; otherwise records are read from stdin.')
+    parser.add_argument('--timings', action='store_true', help='Report the cold start time on stderr.')
+    parser.add_argument('--check-budget', action='store_true',
+                        help=f'Exit with status 3 if the cold start exceeds {COLD_START_BUDGET_MS} ms.')
+    args = parser.parse_args(argv)
+
+    rules = load_from_db() if args.from_db else load_snapshot(args.snapshot)
+    compiled = compile_rules(rules, set(args.rules or ()))
+    if args.rules and len(compiled) != len(set(args.rules)):
+        missing = sorted(set(args.rules) - set(compiled))
+        parser.error(f"Rule(s) not found: {', '.join(missing)}")
+
+    cold_start_ms = (time.perf_counter() - _START) * 1000
+    if args.timings:
+        django_loaded = 'yes' if 'django' in sys.modules else 'no'
+        print(f"cold start: {cold_start_ms:.1f} ms for {len(compiled)} rules (django loaded: {django_loaded})",
+              file=sys.stderr)
+    if args.check_budget and cold_start_ms > COLD_START_BUDGET_MS:
+        print(f"cold start {cold_start_ms:.1f} ms exceeds the {COLD_START_BUDGET_MS} ms budget", file=sys.stderr)
+        return 3
+
+    records = [args.data] if args.data is not None else sys.stdin
+    for line in records:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            # A malformed record is reported on its own line; the rest of the batch still runs
+            print(json.dumps({"error": f"Invalid JSON record: {e}"}))
+            continue
+        if not isinstance(data, dict):
+            print(json.dumps({"error": f"Expected a JSON object, got {type(data).__name__}"}))
+            continue
+        print(json.dumps(evaluate_record(compiled, data)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# engine/management/commands/db_loadtest.py
+
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+
+from engine.management.scratch import scratch_database
+from engine.models import Rule, RuleVersion
+from engine.rules import ast_to_json, build_ast
+
+
+SAMPLE_RULE = "((age > 30 AND department = 'Sales') OR (age < 25 AND department = 'Marketing')) AND (salary > 50000 OR experience > 5)"
+SAMPLE_AST = ast_to_json(build_ast(SAMPLE_RULE))
+ALIAS = 'db_loadtest'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures concurrent read/write throughput of the SQLite database under each "
+        "database profile in settings.DATABASE_PROFILES. Each profile runs on a freshly "
+        "migrated scratch database through Django connections, so the connection_created "
+        "PRAGMAs, OPTIONS and CONN_MAX_AGE of the profile are what is measured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=list(settings.DATABASE_PROFILES),
+                            help='Profiles to compare (default: all).')
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent evaluation (read) threads.')
+        parser.add_argument('--writers', type=int, default=4, help='Concurrent rule edit (write) threads.')
+        parser.add_argument('--duration', type=float, default=3.0, help='Seconds to run each profile.')
+        parser.add_argument('--rules', type=int, default=200, help='Rules seeded before the run.')
+
+    def handle(self, *args, **options):
+        for name in options['profiles']:
+            if name not in settings.DATABASE_PROFILES:
+                raise CommandError(f"Unknown database profile: '{name}'")
+
+        self.stdout.write(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+        for name in options['profiles']:
+            profile = settings.DATABASE_PROFILES[name]
+            if profile['ENGINE'] != 'django.db.backends.sqlite3':
+                self.stdout.write(f"{name:<12} skipped (not an sqlite3 profile)")
+                continue
+            with tempfile.TemporaryDirectory() as tmp, \
+                    override_settings(SQLITE_PRAGMAS=profile['PRAGMAS']), \
+                    scratch_database(ALIAS, os.path.join(tmp, 'loadtest.sqlite3'),
+                                     profile['CONN_MAX_AGE'], dict(profile['OPTIONS'])):
+                self.seed(options['rules'])
+                reads, writes, locked = self.run_profile(options)
+            duration = options['duration']
+            self.stdout.write(f"{name:<12} {reads / duration:>10.0f} {writes / duration:>10.0f} {locked:>8}")
+
+    @staticmethod
+    def seed(count):
+        rules = Rule.objects.using(ALIAS).bulk_create(
+            Rule(rule_name=f"Rule {i}", rule_string=SAMPLE_RULE, ast_json=SAMPLE_AST) for i in range(count)
+        )
+        RuleVersion.objects.using(ALIAS).bulk_create(
+            RuleVersion(rule=rule, version=1, rule_string=SAMPLE_RULE, ast_json=SAMPLE_AST)
+            for rule in Rule.objects.using(ALIAS).all()
+        )
+
+    def run_profile(self, options):
+        """Runs readers and writers concurrently; returns (reads, writes, locked errors)."""
+        rule_count = options['rules']
+        deadline = time.perf_counter() + options['duration']
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker(is_writer, seed):
+            # Each thread gets its own Django connection, as each request thread would
+            connection = connections[ALIAS]
+            rules = Rule.objects.using(ALIAS)
+            done = locked = 0
+            i = seed
+            try:
+                while time.perf_counter() < deadline:
+                    try:
+                        if is_writer:
+                            rules.filter(rule_name=f"Rule {i % rule_count}").update(
+                                rule_string=SAMPLE_RULE, ast_json=SAMPLE_AST)
+                        else:
+                            list(rules.values_list('rule_name', 'ast_json'))
+                        done += 1
+                    except OperationalError as e:
+                        if 'locked' not in str(e):
+                            raise
+                        locked += 1
+                    finally:
+                        # What request_finished does: close unless CONN_MAX_AGE keeps it open
+                        connection.close_if_unusable_or_obsolete()
+                    i += 1
+            finally:
+                connection.close()
+            with lock:
+                counts['writes' if is_writer else 'reads'] += done
+                counts['locked'] += locked
+
+        threads = [threading.Thread(target=worker, args=(False, n)) for n in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(True, n)) for n in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return counts['reads'], counts['writes'], counts['locked']
@@ -0,0 +1,20 @@
+# engine/management/commands/export_rules.py
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from engine.models import Rule
+
+
+class Command(BaseCommand):
+    help = "Writes all rules to a JSON snapshot that `python -m engine.cli --snapshot` can evaluate without Django."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot file to write.')
+
+    def handle(self, *args, **options):
+        rules = list(Rule.objects.values('rule_name', 'rule_string', 'ast_json'))
+        with open(options['path'], 'w') as snapshot:
+            json.dump(rules, snapshot, indent=2)
+        self.stdout.write(f"Exported {len(rules)} rules to {options['path']}")
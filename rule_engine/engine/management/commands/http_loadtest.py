@@ -0,0 +1,305 @@
+# engine/management/commands/http_loadtest.py
+
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from engine.management.scratch import scratch_database
+from engine.models import Rule, RuleVersion
+from engine.rules import ast_to_json, build_ast
+
+
+DEPARTMENTS = ('Sales', 'Marketing', 'Engineering', 'HR', 'Finance')
+ALIAS = 'http_loadtest'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the rule list, evaluate and combine endpoints end to end. Seeds a scratch SQLite "
+        "database with synthetic rules, serves the WSGI and ASGI applications in subprocesses and "
+        "reports requests/s and p50/p95/p99 latency per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi', 'asgi'],
+                            help='Entry points to test (default: both).')
+        parser.add_argument('--rules', type=int, default=200, help='Synthetic rules seeded into the database.')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Requests in flight at once.')
+        parser.add_argument('--rules-per-request', type=int, default=10,
+                            help='Rules selected in each evaluate/combine request.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for rules and request data.')
+        # Internal: run a server for the parent process
+        parser.add_argument('--serve', choices=('wsgi', 'asgi'), help='(internal) Serve the application and block.')
+        parser.add_argument('--port', type=int, help='(internal) Port for --serve.')
+
+    def handle(self, *args, **options):
+        if options['serve'] == 'wsgi':
+            return serve_wsgi(options['port'])
+        if options['serve'] == 'asgi':
+            return serve_asgi(options['port'])
+
+        if options['rules'] < options['rules_per_request']:
+            raise CommandError("--rules must be at least --rules-per-request")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'loadtest.sqlite3')
+            rule_ids = self.seed(db_path, options['rules'], options['seed'])
+
+            for server in options['servers']:
+                port = free_port()
+                with open(os.path.join(tmp, f'{server}.log'), 'w+') as log:
+                    process = subprocess.Popen(
+                        [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'http_loadtest',
+                         '--serve', server, '--port', str(port)],
+                        env={**os.environ, 'RULE_ENGINE_DB_NAME': db_path},
+                        stdout=subprocess.DEVNULL,  # The views' print() calls still run, as in production
+                        stderr=log,
+                    )
+                    try:
+                        wait_for_port(port, process, log)
+                        results = asyncio.run(self.run_endpoints(port, rule_ids, options))
+                    finally:
+                        process.terminate()
+                        process.wait()
+                self.report(server, options, results)
+
+    def seed(self, db_path, count, seed):
+        """Creates and migrates the scratch database under its own alias and fills it with synthetic rules."""
+        rng = random.Random(seed)
+        with scratch_database(ALIAS, db_path):
+            rules = []
+            for i in range(count):
+                rule_string = (
+                    f"(age > {rng.randint(18, 60)} AND department = '{rng.choice(DEPARTMENTS)}') OR "
+                    f"(salary BETWEEN {rng.randint(20, 60) * 1000} AND {rng.randint(61, 120) * 1000} "
+                    f"AND experience >= {rng.randint(0, 10)})"
+                )
+                rules.append(Rule(rule_name=f"Rule {i}", rule_string=rule_string,
+                                  ast_json=ast_to_json(build_ast(rule_string))))
+            Rule.objects.using(ALIAS).bulk_create(rules)
+
+            rules = list(Rule.objects.using(ALIAS).all())
+            RuleVersion.objects.using(ALIAS).bulk_create(
+                RuleVersion(rule=rule, version=1, rule_string=rule.rule_string, ast_json=rule.ast_json)
+                for rule in rules
+            )
+        return [rule.id for rule in rules]
+
+    async def run_endpoints(self, port, rule_ids, options):
+        """Measures each endpoint in turn; returns {endpoint: (latencies, errors, elapsed)}."""
+        rng = random.Random(options['seed'])
+        k = options['rules_per_request']
+
+        # The CSRF cookie from any form page authorizes the POSTs, so CSRF checks are measured too
+        status, headers, _ = await http_request(port, 'GET', reverse('evaluate_rule'))
+        token = csrf_token(headers)
+        if status != 200 or not token:
+            raise CommandError(f"Could not obtain a CSRF token (status {status})")
+        post_headers = {'Cookie': f'csrftoken={token}', 'X-CSRFToken': token,
+                        'Content-Type': 'application/x-www-form-urlencoded'}
+
+        def evaluate_body():
+            data = {'age': rng.randint(18, 65), 'department': rng.choice(DEPARTMENTS),
+                    'salary': rng.randint(20, 120) * 1000, 'experience': rng.randint(0, 15)}
+            return urlencode([('rules', rule_id) for rule_id in rng.sample(rule_ids, k)] + [('expression', json.dumps(data))])
+
+        def combine_body():
+            return urlencode([('rule_ids[]', rule_id) for rule_id in rng.sample(rule_ids, k)] + [('combine_operator', 'OR')])
+
+        endpoints = [
+            ('GET rule_list', 'GET', reverse('rule_list'), None),
+            ('GET evaluate_rule', 'GET', reverse('evaluate_rule'), None),
+            ('POST evaluate_rule', 'POST', reverse('evaluate_rule'), evaluate_body),
+            ('GET combine_rules', 'GET', reverse('combine_rules'), None),
+            ('POST combine_rules', 'POST', reverse('combine_rules'), combine_body),
+        ]
+
+        results = {}
+        for name, method, path, make_body in endpoints:
+            async def one_request():
+                body = make_body() if make_body else None
+                started = time.perf_counter()
+                status, _, _ = await http_request(port, method, path, post_headers if body else {}, body)
+                return time.perf_counter() - started, status
+
+            for _ in range(options['warmup']):
+                await one_request()
+
+            latencies, errors = [], 0
+            remaining = options['requests']
+
+            async def worker():
+                nonlocal remaining, errors
+                while remaining > 0:
+                    remaining -= 1
+                    latency, status = await one_request()
+                    latencies.append(latency)
+                    errors += status >= 400
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+            results[name] = (latencies, errors, time.perf_counter() - started)
+        return results
+
+    def report(self, server, options, results):
+        self.stdout.write(
+            f"\n{server.upper()}: {options['rules']} rules, {options['requests']} requests per endpoint, "
+            f"concurrency {options['concurrency']}"
+        )
+        self.stdout.write(f"{'endpoint':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, (latencies, errors, elapsed) in results.items():
+            latencies.sort()
+            self.stdout.write(
+                f"{name:<20} {len(latencies) / elapsed:>8.1f} "
+                f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+                f"{percentile(latencies, 99):>8.1f} {errors:>7}"
+            )
+
+
+def percentile(sorted_latencies, p):
+    """Nearest-rank percentile of sorted latencies, in milliseconds."""
+    index = max(0, math.ceil(p / 100 * len(sorted_latencies)) - 1)
+    return sorted_latencies[index] * 1000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, log, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise CommandError(f"Server exited with status {process.returncode}:\n{log.read()[-2000:]}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise CommandError(f"Server did not start listening on port {port}")
+
+
+def csrf_token(headers):
+    for name, value in headers:
+        if name == 'set-cookie' and value.startswith('csrftoken='):
+            return value.split(';', 1)[0].split('=', 1)[1]
+    return None
+
+
+async def http_request(port, method, path, headers=None, body=None):
+    """Minimal HTTP/1.1 client on asyncio streams: one connection per request, read until close."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = body.encode() if body else b''
+    lines = [f"{method} {path} HTTP/1.1", f"Host: 127.0.0.1:{port}", "Connection: close",
+             f"Content-Length: {len(payload)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + payload)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+
+    head, _, response_body = raw.partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    response_headers = [(name.strip().lower(), value.strip())
+                        for name, _, value in (line.partition(':') for line in header_lines)]
+    return int(status_line.split(' ', 2)[1]), response_headers, response_body
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Per-request access logging would dominate the measurements
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve_wsgi(port):
+    """Serves rule_engine.wsgi with a threaded wsgiref server."""
+    from rule_engine.wsgi import application
+
+    server = make_server('127.0.0.1', port, application,
+                         server_class=ThreadingWSGIServer, handler_class=QuietWSGIRequestHandler)
+    server.serve_forever()
+
+
+def serve_asgi(port):
+    """Serves rule_engine.asgi with a minimal HTTP/1.1 server on asyncio streams."""
+    from rule_engine.asgi import application
+
+    async def handle(reader, writer):
+        request_line = await reader.readline()
+        if not request_line:
+            writer.close()
+            return
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+        length = int(dict(headers).get(b'content-length', b'0'))
+        body = await reader.readexactly(length) if length else b''
+
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'client': writer.get_extra_info('peername')[:2],
+            'server': ('127.0.0.1', port),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                writer.write(b'HTTP/1.1 %d \r\n' % message['status'])
+                for name, value in message.get('headers', []):
+                    writer.write(name + b': ' + value + b'\r\n')
+                writer.write(b'Connection: close\r\n\r\n')
+            elif message['type'] == 'http.response.body':
+                writer.write(message.get('body', b''))
+
+        await application(scope, receive, send)
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=128)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,28 @@
+# engine/management/scratch.py
+
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connections
+
+
+@contextmanager
+def scratch_database(alias, path, conn_max_age=0, options=None):
+    """
+    Registers a migrated SQLite database at path under its own connection alias, so load
+    tests go through Django's connection setup (connection_created, CONN_MAX_AGE) without
+    touching the settings of the 'default' database. Yields the alias.
+    """
+    connections.databases[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': options or {},
+    }
+    try:
+        call_command('migrate', database=alias, verbosity=0)
+        yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.7 on 2026-10-19 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_initial_versions(apps, schema_editor):
+    """Records each existing rule as its version 1."""
+    Rule = apps.get_model('engine', 'Rule')
+    RuleVersion = apps.get_model('engine', 'RuleVersion')
+    db_alias = schema_editor.connection.alias
+    RuleVersion.objects.using(db_alias).bulk_create(
+        RuleVersion(rule=rule, version=1, rule_string=rule.rule_string, ast_json=rule.ast_json)
+        for rule in Rule.objects.using(db_alias).all()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0003_alter_rule_rule_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rule',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='RuleVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('rule_string', models.TextField()),
+                ('ast_json', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='engine.rule')),
+            ],
+            options={
+                'ordering': ('rule', 'version'),
+                'unique_together': {('rule', 'version')},
+            },
+        ),
+        migrations.AddField(
+            model_name='rule',
+            name='shadow_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='engine.ruleversion'),
+        ),
+        migrations.RunPython(create_initial_versions, migrations.RunPython.noop),
+    ]
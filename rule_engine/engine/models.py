@@ -6,6 +6,28 @@ class Rule(models.Model):
     rule_string = models.TextField()
     ast_json = models.JSONField(null=True, blank=True)  # Allow null and blank values for ast_json
     created_at = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=1)  # Number of the active RuleVersion
+    # Candidate version evaluated in shadow mode alongside the active one until promoted
+    shadow_version = models.ForeignKey('RuleVersion', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
 
     def __str__(self):
         return self.rule_name
+
+    def add_version(self, rule_string, ast_json):
+        """Stores a new version of this rule and returns it; the active rule is left unchanged."""
+        latest = self.versions.aggregate(models.Max('version'))['version__max'] or 0
+        return RuleVersion.objects.create(rule=self, version=latest + 1, rule_string=rule_string, ast_json=ast_json)
+
+class RuleVersion(models.Model):
+    rule = models.ForeignKey(Rule, on_delete=models.CASCADE, related_name='versions')
+    version = models.PositiveIntegerField()
+    rule_string = models.TextField()
+    ast_json = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('rule', 'version')
+        ordering = ('rule', 'version')
+
+    def __str__(self):
+        return f"{self.rule.rule_name} v{self.version}"
@@ -0,0 +1,696 @@
+# engine/rules.py
+"""
+Rule parsing, combination, compilation and evaluation.
+
+This module does not depend on Django, so batch jobs can evaluate rules
+without calling django.setup() or importing the view stack (see engine/cli.py).
+"""
+
+import re
+import sys
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from functools import lru_cache
+from operator import eq, ge, gt, le, lt, ne
+
+from .ast import Node
+
+def validate_rule_string(rule_string):
+    """
+    Validates the rule string for errors such as:
+    - Missing operators
+    - Invalid comparisons
+    - Unmatched parentheses
+    - Malformed IN lists and BETWEEN ranges
+    - IN lists and BETWEEN ranges that mix string and numeric literals
+    """
+    # Basic operator and operand patterns
+    operator_pattern = r'\b(AND|OR)\b'
+    list_item_pattern = r"(?:'[^']*'|[^,\s()']+)"
+    operand_pattern = (
+        r'([a-zA-Z_]+|\([a-zA-Z_ ]+\))\s*(>|<|=|!=|>=|<=)\s*\S+'
+        rf'|[a-zA-Z_][a-zA-Z0-9_]*\s+IN\s*\(\s*{list_item_pattern}(?:\s*,\s*{list_item_pattern})*$'
+        r'|[a-zA-Z_][a-zA-Z0-9_]*\s+BETWEEN\s+\S+\s+__AND__\s+\S+$'
+    )
+    
+    # Check for unmatched parentheses
+    if rule_string.count('(') != rule_string.count(')'):
+        raise ValueError("Unmatched parentheses in rule string.")
+    
+    # Remove leading/trailing spaces
+    rule_string = original = rule_string.strip()
+
+    # The AND in "age BETWEEN 25 AND 35" is part of the operand, not a logical operator
+    rule_string = re.sub(r'\bBETWEEN\s+(\S+)\s+AND\s+', r'BETWEEN \1 __AND__ ', rule_string)
+
+    # Tokenize the rule string into operands and operators
+    tokens = re.split(r'(\s+AND\s+|\s+OR\s+)', rule_string)
+    
+    for i, token in enumerate(tokens):
+        token = token.strip()
+        
+        if not token:
+            continue  # Skip empty tokens
+        
+        # Odd indexed tokens should be operators
+        if i % 2 == 1:
+            if not re.match(operator_pattern, token):
+                raise ValueError(f"Invalid operator found: '{token}'")
+        else:
+            # Even indexed tokens should be operands (e.g., "age > 30")
+            # Strip leading and trailing parentheses from tokens
+            token = token.strip('() ')
+            if not re.match(operand_pattern, token):
+                raise ValueError(f"Invalid operand or comparison in: '{token}'")
+
+    # Compiling types every literal, so rules that could never be evaluated are rejected here
+    compile_rule(build_ast(original))
+    return True
+
+def tokenize(expression):
+    """Tokenizes the input expression into meaningful components."""
+    # Match operators, list separators, identifiers, numbers, and string literals
+    tokens = re.findall(r'\s*([()<>!=]=?|,|(?:AND|OR)\b|[a-zA-Z_][a-zA-Z0-9_]*|\'[^\']*\'|-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*', expression)
+    return [token for token in tokens if token]  # Filter out empty tokens
+
+def parse_expression(tokens):
+    """
+    Parses the tokens (a deque) to create an AST considering parentheses.
+    Nested parentheses are tracked with an explicit stack rather than recursion.
+    """
+    def parse_operand():
+        """Parse an operand such as "age > 30", "department IN ('Sales', 'HR')" or "age BETWEEN 25 AND 35"."""
+        if not tokens:
+            raise ValueError("Unexpected end of rule string")
+        operand = tokens.popleft()
+        # Continue to capture the complete condition
+        condition = operand
+        while tokens and tokens[0] not in ('AND', 'OR', ')'):
+            token = tokens.popleft()
+            if token == 'IN':
+                condition += f" IN ({', '.join(parse_value_list())})"
+            elif token == 'BETWEEN':
+                # The AND inside "BETWEEN 25 AND 35" is not a logical operator
+                if len(tokens) < 3 or tokens[1] != 'AND':
+                    raise ValueError("Expected 'BETWEEN <low> AND <high>'")
+                low, _, high = tokens.popleft(), tokens.popleft(), tokens.popleft()
+                condition += f" BETWEEN {low} AND {high}"
+            else:
+                condition += ' ' + token
+        return {
+            "type": "operand",
+            "value": condition.strip()
+        }
+
+    def parse_value_list():
+        """Parse the parenthesized value list of an IN condition, e.g. ('Sales', 'Marketing')."""
+        if not tokens or tokens.popleft() != '(':
+            raise ValueError("Expected '(' after IN")
+        values = []
+        while tokens and tokens[0] != ')':
+            value = tokens.popleft()
+            # Values and commas must alternate
+            if (value == ',') != bool(len(values) and values[-1] != ','):
+                raise ValueError("IN list values must be separated by commas")
+            values.append(value)
+        if not tokens or not values:
+            raise ValueError("Unterminated or empty IN list")
+        if values[-1] == ',':
+            raise ValueError("IN list values must be separated by commas")
+        tokens.popleft()  # Remove ')'
+        return values[::2]
+
+    # One frame per open parenthesis: [operands of the current run, the run's operator].
+    # Operators still apply left to right, but each run of the same operator is folded
+    # into a balanced subtree so long chains stay shallow.
+    frames = [[[], None]]
+    expect_operand = True
+    while True:
+        run, run_operator = frames[-1]
+        if expect_operand:
+            if tokens and tokens[0] == '(':
+                tokens.popleft()  # Remove '('
+                frames.append([[], None])
+                continue
+            run.append(parse_operand())
+            expect_operand = False
+        elif tokens and tokens[0] in ('AND', 'OR'):
+            operator = tokens.popleft()  # Get the operator
+            if run_operator is not None and operator != run_operator:
+                frames[-1][0] = [fold_chain(run, run_operator)]
+            frames[-1][1] = operator
+            expect_operand = True
+        elif len(frames) > 1:
+            if not tokens or tokens[0] != ')':
+                raise ValueError("Unmatched parentheses in rule string.")
+            tokens.popleft()  # Remove ')'
+            frames.pop()
+            frames[-1][0].append(fold_chain(run, run_operator))
+        else:
+            return fold_chain(run, run_operator)
+
+
+def build_ast(condition):
+    """Builds an AST from the given logical expression string."""
+    tokens = deque(tokenize(condition))
+    ast = parse_expression(tokens)
+
+    if tokens:
+        raise ValueError("Extra tokens remaining after parsing")
+
+    return ast
+
+def ast_to_json(ast_root):
+    """Copies the AST into its JSON form using an explicit stack instead of recursion."""
+    root = {}
+    stack = [(ast_root, root)]
+    while stack:
+        node, json_node = stack.pop()
+        json_node["type"] = node['type']
+        json_node["value"] = node['value']
+        if node['type'] == 'operator':
+            json_node["left"], json_node["right"] = {}, {}
+            stack.append((node['left'], json_node["left"]))
+            stack.append((node['right'], json_node["right"]))
+    return root
+
+def create_rule_ast(rule_string):
+    # A function that parses the rule string and generates an AST.
+    # Placeholder example: Actual implementation should convert rule strings into AST format.
+    # You can use a parser to convert "age > 30 AND department = 'Sales'" into an AST.
+    # Returning a dummy node for illustration.
+    return Node("operand", rule_string)
+
+def combine_ast(ast1, ast2, operator):
+    """Combine two ASTs under a new root with the specified operator."""
+    if ast1 == ast2:
+        return ast1  # If both subtrees are identical, return one to avoid redundancy
+    return Node("operator", value=operator, left=ast1, right=ast2)
+
+def find_common_subexpressions(ast1, ast2):
+    """Finds common sub-expressions between two ASTs."""
+    if ast1 == ast2:
+        return ast1  # If they are identical, return one copy
+    return None  # Otherwise, no common sub-expression
+
+def combine_rules1(rule_strings, operator="AND"):
+    """
+    Combines a list of rule strings into a single AST, minimizing redundancy.
+    ASTs are paired up level by level, so the result is balanced and only
+    log2(n) deep even when thousands of rules are combined.
+    """
+    if not rule_strings:
+        return None  # No rules to combine
+
+    # Step 1: Create AST for each rule, skipping rules that are repeated
+    ast_list = [create_rule_ast(rule) for rule in dict.fromkeys(rule_strings)]
+
+    # Step 2: Combine neighbouring ASTs until a single root remains
+    while len(ast_list) > 1:
+        combined = []
+        for i in range(0, len(ast_list) - 1, 2):
+            common_subexpr = find_common_subexpressions(ast_list[i], ast_list[i + 1])
+            if common_subexpr:
+                # If there's a common sub-expression, we can merge without duplicating
+                combined.append(common_subexpr)
+            else:
+                combined.append(combine_ast(ast_list[i], ast_list[i + 1], operator))
+        if len(ast_list) % 2:
+            combined.append(ast_list[-1])  # Odd one out moves up a level unchanged
+        ast_list = combined
+
+    return ast_list[0]
+
+
+def ast_to_rule_string(node):
+    """Converts an AST back into a rule string, e.g. "(age > 30 AND salary > 50000)"."""
+    if not node:
+        return ""
+    return str(node)  # Node.__str__ walks the tree without recursion
+
+
+def json_to_node(ast_json):
+    """Converts the AST JSON produced by build_ast into a tree of Node objects."""
+    root = Node(ast_json['type'], ast_json['value'])
+    stack = [(ast_json, root)]
+    while stack:
+        json_node, node = stack.pop()
+        if json_node['type'] == 'operator':
+            node.left = Node(json_node['left']['type'], json_node['left']['value'])
+            node.right = Node(json_node['right']['type'], json_node['right']['value'])
+            stack.append((json_node['left'], node.left))
+            stack.append((json_node['right'], node.right))
+    return root
+
+
+def flatten_chain(ast_json, operator):
+    """Returns the operands of a maximal chain of `operator` nodes, left to right."""
+    leaves, stack = [], [ast_json]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict) and node.get('type') == 'operator' and node['value'] == operator:
+            stack.append(node['right'])
+            stack.append(node['left'])
+        else:
+            leaves.append(node)
+    return leaves
+
+
+def fold_chain(nodes, operator):
+    """Joins nodes with `operator` into a balanced tree, keeping their left-to-right order."""
+    while len(nodes) > 1:
+        paired = [
+            {"type": "operator", "value": operator, "left": nodes[i], "right": nodes[i + 1]}
+            for i in range(0, len(nodes) - 1, 2)
+        ]
+        if len(nodes) % 2:
+            paired.append(nodes[-1])
+        nodes = paired
+    return nodes[0]
+
+
+def merge_membership(leaves):
+    """
+    Merges the equality and IN operands of an OR chain that test the same attribute
+    into a single IN operand, keeping the position of the first one.
+    """
+    groups, merged = {}, []
+    for leaf in leaves:
+        if isinstance(leaf, dict) and leaf.get('type') == 'operand':
+            attribute, operator, target_value = parse_condition(leaf['value'])
+            if operator in ('=', 'IN'):
+                values = target_value if operator == 'IN' else (target_value,)
+                # Strings and numbers are kept apart so type checks behave as before
+                key = (attribute, isinstance(values[0], str))
+                if key in groups:
+                    groups[key][1].extend(values)
+                    groups[key][2] += 1
+                    continue
+                groups[key] = [leaf, list(values), 1]
+                merged.append(key)
+                continue
+        merged.append(leaf)
+
+    result = []
+    for item in merged:
+        if isinstance(item, tuple):
+            leaf, values, count = groups[item]
+            if count > 1:
+                values = ', '.join(format_literal(value) for value in dict.fromkeys(values))
+                leaf = {"type": "operand", "value": f"{item[0]} IN ({values})"}
+            item = leaf
+        result.append(item)
+    return result
+
+
+def collapse_in_chains(ast_json):
+    """Rewrites OR-of-equality chains such as "d = 'a' OR d = 'b'" into "d IN ('a', 'b')"."""
+    if ast_json.get('type') != 'operator':
+        return ast_json
+
+    # Whole AND/OR chains are handled at once; a frame is pushed only where the operator
+    # changes, so alternating trees are walked with an explicit stack instead of recursion.
+    # Frame: [operator, operands of the chain, operands already collapsed]
+    frames = [[ast_json['value'], flatten_chain(ast_json, ast_json['value']), []]]
+    while True:
+        operator, leaves, collapsed = frames[-1]
+        if len(collapsed) < len(leaves):
+            leaf = leaves[len(collapsed)]
+            if isinstance(leaf, dict) and leaf.get('type') == 'operator':
+                frames.append([leaf['value'], flatten_chain(leaf, leaf['value']), []])
+            else:
+                collapsed.append(leaf)
+            continue
+
+        if operator == 'OR':
+            collapsed = merge_membership(collapsed)
+        node = fold_chain(collapsed, operator)
+        frames.pop()
+        if not frames:
+            return node
+        frames[-1][2].append(node)
+
+
+def combine_rules_logic(rule_strings, operator):
+    """Combines the given rule strings using the specified operator."""
+    combined_ast = combine_rules1(rule_strings, operator)
+    ans = ast_to_rule_string(combined_ast)
+    if not ans:
+        return ans
+
+    # Collapse OR-of-equality chains, across rules as well as within them, into IN conditions
+    optimized_ast = collapse_in_chains(build_ast(ans))
+    return ast_to_rule_string(json_to_node(optimized_ast))
+
+
+# Attribute names, comparison operators and literals (quoted strings or bare words)
+CONDITION_PATTERN = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*)\s*(>=|<=|!=|>|<|=)\s*('[^']*'|\S+)$")
+IN_PATTERN = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*)\s+IN\s*\((.*)\)$")
+BETWEEN_PATTERN = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*)\s+BETWEEN\s+('[^']*'|\S+)\s+AND\s+('[^']*'|\S+)$")
+LIST_ITEM_PATTERN = re.compile(r"'[^']*'|[^,\s]+")
+IN_LIST_PATTERN = re.compile(r"\s*(?:'[^']*'|[^,\s']+)(?:\s*,\s*(?:'[^']*'|[^,\s']+))*\s*$")
+INT_PATTERN = re.compile(r"[+-]?\d+$")
+FLOAT_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$")
+
+COMPARATORS = {">": gt, "<": lt, "=": eq, "!=": ne, ">=": ge, "<=": le}
+
+
+def parse_literal(text):
+    """Types a literal once: quoted or bare words become interned strings, numbers become int/float."""
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return sys.intern(text[1:-1])
+    if INT_PATTERN.match(text):
+        return int(text)
+    if FLOAT_PATTERN.match(text):
+        return float(text)
+    return sys.intern(text.strip("'"))
+
+
+def format_literal(value):
+    """Renders a typed literal back into rule string syntax."""
+    if isinstance(value, str):
+        return f"'{value}'"
+    return repr(value)
+
+
+@lru_cache(maxsize=16384)
+def parse_condition(condition):
+    """
+    Splits a condition such as "age > 30" into (attribute, operator, typed literal).
+    IN conditions carry a tuple of literals and BETWEEN conditions a (low, high) pair.
+    Results are cached, so each condition's literal is typed only once.
+    """
+    condition = condition.strip()
+
+    match = IN_PATTERN.match(condition)
+    if match:
+        attribute, values = match.groups()
+        if not values.strip():
+            raise ValueError("Unterminated or empty IN list")
+        if not IN_LIST_PATTERN.match(values):
+            raise ValueError("IN list values must be separated by commas")
+        return attribute, "IN", tuple(parse_literal(value) for value in LIST_ITEM_PATTERN.findall(values))
+
+    # Remove any leading or trailing parentheses
+    condition = condition.strip('()').strip()
+
+    match = BETWEEN_PATTERN.match(condition)
+    if match:
+        attribute, low, high = match.groups()
+        return attribute, "BETWEEN", (parse_literal(low), parse_literal(high))
+
+    match = CONDITION_PATTERN.match(condition)
+    if not match:
+        raise ValueError(f"Invalid condition format: {condition}")
+
+    attribute, operator, target_value = match.groups()
+    return attribute, operator, parse_literal(target_value)
+
+
+def type_mismatch(attribute, actual_value, target_value):
+    return ValueError(
+        f"Cannot compare attribute '{attribute}' of type {type(actual_value).__name__} "
+        f"with literal {target_value!r}"
+    )
+
+
+def literal_types(values):
+    """Returns the attribute types the literals can be compared with; mixing strings and numbers is an error."""
+    if all(isinstance(value, str) for value in values):
+        return (str,)
+    if not any(isinstance(value, str) for value in values):
+        return (int, float)
+    raise ValueError(f"Mixed string and numeric literals: {values!r}")
+
+
+def numeric_kernel(attribute, operator, target_value):
+    """Comparison kernel for int/float literals."""
+    compare = COMPARATORS[operator]
+
+    def kernel(data):
+        actual_value = data.get(attribute)
+        if actual_value is None:
+            return False  # If the attribute is missing in data, return False
+        # Fast path: plain int/float attributes
+        actual_type = type(actual_value)
+        if actual_type is int or actual_type is float:
+            return compare(actual_value, target_value)
+        if isinstance(actual_value, (int, float)):
+            return compare(actual_value, target_value)
+        raise type_mismatch(attribute, actual_value, target_value)
+
+    return kernel
+
+
+def string_kernel(attribute, operator, target_value):
+    """Comparison kernel for string literals; equality checks identity first since literals are interned."""
+    if operator in ("=", "!="):
+        negate = operator == "!="
+
+        def kernel(data):
+            actual_value = data.get(attribute)
+            if actual_value is None:
+                return False  # If the attribute is missing in data, return False
+            if actual_value is target_value:
+                return not negate
+            if type(actual_value) is not str:
+                raise type_mismatch(attribute, actual_value, target_value)
+            return (actual_value == target_value) is not negate
+
+        return kernel
+
+    compare = COMPARATORS[operator]
+
+    def kernel(data):
+        actual_value = data.get(attribute)
+        if actual_value is None:
+            return False
+        if type(actual_value) is not str:
+            raise type_mismatch(attribute, actual_value, target_value)
+        return compare(actual_value, target_value)
+
+    return kernel
+
+
+def membership_kernel(attribute, values):
+    """Kernel for IN conditions: a single frozenset lookup instead of a chain of equality checks."""
+    allowed_types = literal_types(values)
+    value_set = frozenset(values)
+
+    def kernel(data):
+        actual_value = data.get(attribute)
+        if actual_value is None:
+            return False
+        if not isinstance(actual_value, allowed_types):
+            raise type_mismatch(attribute, actual_value, values)
+        return actual_value in value_set
+
+    return kernel
+
+
+def range_kernel(attribute, ranges):
+    """
+    Kernel for one or more BETWEEN ranges on the same attribute (inclusive bounds).
+    Overlapping ranges are merged and the value is located with a single bisect.
+    """
+    allowed_types = literal_types([bound for bounds in ranges for bound in bounds])
+
+    lows, highs = [], []
+    for low, high in sorted(bounds for bounds in ranges if bounds[0] <= bounds[1]):
+        if highs and low <= highs[-1]:
+            highs[-1] = max(highs[-1], high)
+        else:
+            lows.append(low)
+            highs.append(high)
+
+    def kernel(data):
+        actual_value = data.get(attribute)
+        if actual_value is None:
+            return False
+        if not isinstance(actual_value, allowed_types):
+            raise type_mismatch(attribute, actual_value, ranges)
+        i = bisect_right(lows, actual_value) - 1
+        return i >= 0 and actual_value <= highs[i]
+
+    return kernel
+
+
+@lru_cache(maxsize=4096)
+def compile_condition(condition):
+    """Compiles a condition string into a kernel specialized for its operator and literal type."""
+    attribute, operator, target_value = parse_condition(condition)
+    if operator == "IN":
+        return membership_kernel(attribute, target_value)
+    if operator == "BETWEEN":
+        return range_kernel(attribute, [target_value])
+    if isinstance(target_value, str):
+        return string_kernel(attribute, operator, target_value)
+    return numeric_kernel(attribute, operator, target_value)
+
+
+# Nested AND/OR closures deeper than this are evaluated with an explicit stack instead
+MAX_KERNEL_DEPTH = 100
+
+
+def compile_rule(ast_json):
+    """
+    Compiles the rule's AST JSON into a callable taking the data dictionary.
+    Literals are typed once here rather than on every evaluation, and each AND/OR
+    chain becomes a single n-ary kernel. The tree is walked with an explicit stack,
+    and chains nested deeper than MAX_KERNEL_DEPTH are evaluated by evaluate_chains,
+    so neither compiling nor evaluating recurses once per node.
+    """
+    compiled = {}  # id(node) -> kernel, or (operator, items) for chains left to evaluate_chains
+    depths = {}  # id(node) -> nesting depth of the kernel's closures
+    operands = {}  # id(node) -> operands of the AND/OR chain rooted at node
+    stack = [ast_json]
+    while stack:
+        node = stack[-1]
+        key = id(node)
+        if key in compiled:
+            stack.pop()
+            continue
+
+        # Ensure that node is a dictionary and not a string
+        if isinstance(node, str):
+            # If node is a string, it's likely an operand that was misformatted
+            # or passed incorrectly; raise an exception for clarity
+            raise ValueError(f"Unexpected string node: {node}")
+
+        node_type = node.get("type")
+
+        # If it's an operator node (AND/OR), compile its operands first
+        if node_type == "operator" and node["value"] in ("AND", "OR"):
+            if key not in operands:
+                chain = flatten_chain(node, node["value"])
+                operands[key] = merge_membership(chain) if node["value"] == "OR" else chain
+                stack.extend(operands[key])
+                continue
+            items = chain_items(node["value"], operands[key], compiled)
+            depths[key] = 1 + max(depths.get(id(operand), 0) for operand in operands[key])
+            if depths[key] <= MAX_KERNEL_DEPTH and all(callable(item) for item in items):
+                compiled[key] = chain_kernel(node["value"], items)
+            else:
+                compiled[key] = (node["value"], items)
+
+        # If it's an operand node (e.g., age > 30)
+        elif node_type == "operand":
+            compiled[key] = compile_condition(node["value"])
+
+        else:
+            compiled[key] = lambda data: False
+        stack.pop()
+
+    root = compiled[id(ast_json)]
+    if callable(root):
+        return root
+    return lambda data: evaluate_chains(root, data)
+
+
+def chain_items(operator, operands, compiled):
+    """
+    Collects the compiled operands of an AND/OR chain. In an OR chain, BETWEEN
+    conditions on the same attribute share a single bisect range check.
+    """
+    items, range_positions, ranges = [], {}, {}
+    for operand in operands:
+        if operator == "OR" and operand.get("type") == "operand":
+            attribute, condition_operator, target_value = parse_condition(operand["value"])
+            if condition_operator == "BETWEEN":
+                # String and numeric ranges are kept apart, as in merge_membership
+                key = (attribute, isinstance(target_value[0], str))
+                if key not in ranges:
+                    range_positions[key] = len(items)
+                    ranges[key] = []
+                    items.append(None)  # Filled in once all ranges are known
+                ranges[key].append(target_value)
+                continue
+        items.append(compiled[id(operand)])
+
+    for key, position in range_positions.items():
+        items[position] = range_kernel(key[0], ranges[key])
+    return items
+
+
+def chain_kernel(operator, kernels):
+    """Joins the kernels of an AND/OR chain into one short-circuiting kernel."""
+    if len(kernels) == 1:
+        return kernels[0]
+    if len(kernels) == 2:
+        left, right = kernels
+        if operator == "AND":
+            return lambda data: left(data) and right(data)
+        return lambda data: left(data) or right(data)
+    if operator == "AND":
+        return lambda data: all(kernel(data) for kernel in kernels)
+    return lambda data: any(kernel(data) for kernel in kernels)
+
+
+def evaluate_chains(chain, data):
+    """
+    Evaluates nested (operator, items) chains with an explicit stack, where each
+    item is a kernel or another chain. AND stops at the first False, OR at the first True.
+    """
+    stack = [(chain[0], iter(chain[1]))]
+    result = None
+    while stack:
+        operator, items = stack[-1]
+        if result is not None and (result if operator == "OR" else not result):
+            stack.pop()  # Short-circuit: this chain's result is decided
+            continue
+        item = next(items, None)
+        if item is None:
+            stack.pop()  # Chain exhausted: its result is that of its last item
+        elif callable(item):
+            result = item(data)
+        else:
+            result = None
+            stack.append((item[0], iter(item[1])))
+    return result
+
+
+# Compiled rules by caller-supplied key, most recently used last
+MAX_COMPILED_RULES = 1024
+_compiled_rules = OrderedDict()
+_compiled_rules_lock = threading.Lock()
+
+
+def get_compiled_rule(cache_key, ast_json):
+    """
+    Returns compile_rule(ast_json), compiling it only the first time cache_key is seen.
+    The key must change whenever the AST does, e.g. (rule id, version).
+    """
+    with _compiled_rules_lock:
+        kernel = _compiled_rules.get(cache_key)
+        if kernel is not None:
+            _compiled_rules.move_to_end(cache_key)
+            return kernel
+
+    kernel = compile_rule(ast_json)  # Compiled outside the lock; a racing thread just compiles twice
+    with _compiled_rules_lock:
+        _compiled_rules[cache_key] = kernel
+        if len(_compiled_rules) > MAX_COMPILED_RULES:
+            _compiled_rules.popitem(last=False)
+    return kernel
+
+
+def clear_compiled_rules():
+    """Drops every cached compiled rule, e.g. when rule ids can be reused (test databases)."""
+    with _compiled_rules_lock:
+        _compiled_rules.clear()
+
+
+def evaluate_rule(ast_json, data, cache_key=None):
+    """
+    Evaluates the rule based on the provided AST and data.
+    
+    :param ast_json: JSON representation of the rule's AST.
+    :param data: Dictionary containing attribute values (e.g., {"age": 35, "department": "Sales"}).
+    :param cache_key: Optional key identifying this AST, e.g. (rule id, version); the compiled rule is reused.
+    :return: True if the data satisfies the rule, False otherwise.
+    :raises ValueError: If an attribute's type does not match the literal it is compared with.
+    """
+    if cache_key is None:
+        return compile_rule(ast_json)(data)
+    return get_compiled_rule(cache_key, ast_json)(data)
@@ -0,0 +1,136 @@
+# engine/shadow.py
+"""
+Shadow evaluation of candidate rule versions.
+
+When a rule has a shadow_version, the evaluation endpoints hand the request data to a
+background thread pool, which evaluates the candidate and compares it with the active
+version's result. Divergence counts and per-version latency histograms are kept in
+memory per process and served by ShadowStatsView.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .rules import evaluate_rule
+
+# Upper bounds (microseconds) of the latency histogram buckets; slower evaluations go to "+Inf"
+LATENCY_BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+_lock = threading.Lock()
+_executor = None
+_pending = 0
+_stats = {}  # (rule_name, active version, candidate version) -> counters
+
+
+def get_executor():
+    """Creates the thread pool on first use so importing this module starts no threads."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RULE_SHADOW_WORKERS', 2),
+                thread_name_prefix='rule-shadow',
+            )
+        return _executor
+
+
+def new_histogram():
+    return {**{str(bound): 0 for bound in LATENCY_BUCKETS_US}, '+Inf': 0}
+
+
+def observe(histogram, seconds):
+    microseconds = seconds * 1_000_000
+    for bound in LATENCY_BUCKETS_US:
+        if microseconds <= bound:
+            histogram[str(bound)] += 1
+            return
+    histogram['+Inf'] += 1
+
+
+def get_entry(key):
+    """Returns the counters for a (rule, active, candidate) triple; call with _lock held."""
+    if key not in _stats:
+        _stats[key] = {
+            'evaluations': 0,
+            'divergences': 0,
+            'candidate_errors': 0,
+            'dropped': 0,
+            'latency_us': {'active': new_histogram(), 'candidate': new_histogram()},
+        }
+    return _stats[key]
+
+
+def submit(rule, data, active_result, active_seconds):
+    """
+    Queues a shadow evaluation of rule.shadow_version against data. Everything the worker
+    needs is read here, so it never touches the ORM. If the backlog exceeds
+    RULE_SHADOW_MAX_PENDING the evaluation is dropped and counted instead.
+    """
+    global _pending
+    candidate = rule.shadow_version
+    key = (rule.rule_name, rule.version, candidate.version)
+
+    with _lock:
+        if _pending >= getattr(settings, 'RULE_SHADOW_MAX_PENDING', 1000):
+            get_entry(key)['dropped'] += 1
+            return
+        _pending += 1
+
+    try:
+        get_executor().submit(run_shadow, key, (rule.id, candidate.version), candidate.ast_json, data,
+                              active_result, active_seconds)
+    except RuntimeError:  # The pool is shutting down with the interpreter
+        with _lock:
+            _pending -= 1
+
+
+def run_shadow(key, cache_key, candidate_ast, data, active_result, active_seconds):
+    global _pending
+    diverged = errored = False
+    started = time.perf_counter()
+    try:
+        diverged = evaluate_rule(candidate_ast, data, cache_key=cache_key) != active_result
+    except Exception:  # Any failure of the candidate is counted; it must not kill the worker
+        errored = True
+    finally:
+        candidate_seconds = time.perf_counter() - started
+        with _lock:
+            _pending -= 1
+            entry = get_entry(key)
+            entry['evaluations'] += 1
+            entry['divergences'] += diverged
+            entry['candidate_errors'] += errored
+            observe(entry['latency_us']['active'], active_seconds)
+            observe(entry['latency_us']['candidate'], candidate_seconds)
+
+
+def get_stats():
+    """Returns a JSON-serializable copy of the shadow evaluation counters."""
+    with _lock:
+        return {
+            'pending': _pending,
+            'rules': [
+                {
+                    'rule_name': rule_name,
+                    'active_version': active_version,
+                    'candidate_version': candidate_version,
+                    'evaluations': entry['evaluations'],
+                    'divergences': entry['divergences'],
+                    'candidate_errors': entry['candidate_errors'],
+                    'dropped': entry['dropped'],
+                    'latency_us': {
+                        'active': dict(entry['latency_us']['active']),
+                        'candidate': dict(entry['latency_us']['candidate']),
+                    },
+                }
+                for (rule_name, active_version, candidate_version), entry in _stats.items()
+            ],
+        }
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
@@ -1,3 +1,370 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import shadow
+from .cli import COLD_START_BUDGET_MS
+from .management.scratch import scratch_database
+from .models import Rule
+from .views import RuleListView
+
+from .rules import (
+    ast_to_json,
+    ast_to_rule_string,
+    build_ast,
+    clear_compiled_rules,
+    collapse_in_chains,
+    combine_rules_logic,
+    evaluate_rule,
+    get_compiled_rule,
+    json_to_node,
+    parse_condition,
+    tokenize,
+    validate_rule_string,
+)
+
+
+class LiteralTypingTests(SimpleTestCase):
+    def test_negative_and_exponent_literals_are_numbers(self):
+        self.assertEqual(parse_condition("balance > -5"), ("balance", ">", -5))
+        self.assertEqual(parse_condition("score >= 1.5e3"), ("score", ">=", 1500.0))
+        self.assertEqual(parse_condition("ratio <= .5"), ("ratio", "<=", 0.5))
+        self.assertEqual(tokenize("balance > -5 AND score >= 1.5e3"),
+                         ["balance", ">", "-5", "AND", "score", ">=", "1.5e3"])
+
+    def test_two_character_operators(self):
+        self.assertEqual(parse_condition("age >= 30"), ("age", ">=", 30))
+        self.assertEqual(parse_condition("age != 30"), ("age", "!=", 30))
+
+    def test_quoted_strings_keep_spaces(self):
+        self.assertEqual(parse_condition("department = 'Sales Team'"), ("department", "=", "Sales Team"))
+
+    def test_evaluates_typed_literals(self):
+        ast = build_ast("balance > -5 AND score >= 1.5e3")
+        self.assertTrue(evaluate_rule(ast, {"balance": -1, "score": 1500.0}))
+        self.assertFalse(evaluate_rule(ast, {"balance": -6, "score": 1500}))
+
+    def test_missing_attribute_is_false(self):
+        self.assertFalse(evaluate_rule(build_ast("age > 30"), {}))
+
+
+class TypeMismatchTests(SimpleTestCase):
+    def test_string_attribute_against_number_literal(self):
+        with self.assertRaisesMessage(ValueError, "Cannot compare attribute 'age' of type str"):
+            evaluate_rule(build_ast("age > 30"), {"age": "35"})
+
+    def test_number_attribute_against_string_literal(self):
+        with self.assertRaisesMessage(ValueError, "Cannot compare attribute 'department' of type int"):
+            evaluate_rule(build_ast("department = 'Sales'"), {"department": 3})
+
+
+class SetAndRangeOperatorTests(SimpleTestCase):
+    def test_in_and_between_parse_to_typed_literals(self):
+        self.assertEqual(parse_condition("department IN ('Sales', 'HR')"), ("department", "IN", ("Sales", "HR")))
+        self.assertEqual(parse_condition("age BETWEEN 25 AND 35"), ("age", "BETWEEN", (25, 35)))
+
+    def test_between_and_is_not_a_logical_operator(self):
+        ast = build_ast("age BETWEEN 25 AND 35 AND department IN ('Sales', 'HR')")
+        self.assertEqual(ast["value"], "AND")
+        self.assertEqual(ast["left"]["value"], "age BETWEEN 25 AND 35")
+        self.assertEqual(ast["right"]["value"], "department IN ('Sales', 'HR')")
+
+    def test_validation(self):
+        self.assertTrue(validate_rule_string("age BETWEEN 25 AND 35 OR department IN ('Sales', 'HR')"))
+        for rule_string in ("age IN ()", "age BETWEEN 5", "age BETWEEN 5 OR x = 1"):
+            with self.subTest(rule_string=rule_string), self.assertRaises(ValueError):
+                validate_rule_string(rule_string)
+
+    def test_in_and_between_evaluation(self):
+        ast = build_ast("department IN ('Sales', 'HR') AND age BETWEEN 25 AND 35")
+        self.assertTrue(evaluate_rule(ast, {"department": "HR", "age": 35}))
+        self.assertFalse(evaluate_rule(ast, {"department": "Ops", "age": 30}))
+        self.assertFalse(evaluate_rule(ast, {"department": "HR", "age": 36}))
+
+    def test_or_of_ranges_merges_into_one_check(self):
+        ast = build_ast("age BETWEEN 1 AND 5 OR age BETWEEN 4 AND 10 OR age BETWEEN 20 AND 30")
+        results = [evaluate_rule(ast, {"age": age}) for age in (0, 1, 7, 10, 11, 25, 31)]
+        self.assertEqual(results, [False, True, True, True, False, True, False])
+
+    def test_string_and_numeric_ranges_on_one_attribute_stay_apart(self):
+        ast = build_ast("age BETWEEN 25 AND 35 OR age BETWEEN 'a' AND 'z'")
+        self.assertTrue(evaluate_rule(ast, {"age": 30}))
+
+    def test_mixed_literal_types_are_rejected_by_validation(self):
+        for rule_string in ("x IN (1, 'a')", "x BETWEEN 'a' AND 5", "age > 3 OR x IN ('a', 2)"):
+            with self.subTest(rule_string=rule_string), \
+                    self.assertRaisesMessage(ValueError, "Mixed string and numeric literals"):
+                validate_rule_string(rule_string)
+
+    def test_in_list_requires_commas(self):
+        for rule_string in ("x IN ('a' 'b')", "x IN ('a',)", "x IN (, 'a')"):
+            with self.subTest(rule_string=rule_string), self.assertRaises(ValueError):
+                validate_rule_string(rule_string)
+            with self.subTest(rule_string=rule_string), self.assertRaises(ValueError):
+                build_ast(rule_string)
+        with self.assertRaisesMessage(ValueError, "IN list values must be separated by commas"):
+            parse_condition("x IN ('a' 'b')")
+
+    def test_empty_in_list_in_stored_ast(self):
+        ast = {"type": "operator", "value": "OR", "left": {"type": "operand", "value": "x IN ()"},
+               "right": {"type": "operand", "value": "x = 1"}}
+        with self.assertRaisesMessage(ValueError, "Unterminated or empty IN list"):
+            collapse_in_chains(ast)
+        with self.assertRaisesMessage(ValueError, "Unterminated or empty IN list"):
+            evaluate_rule(ast, {"x": 1})
+
+    def test_in_type_mismatch(self):
+        with self.assertRaisesMessage(ValueError, "Cannot compare attribute 'd' of type int"):
+            evaluate_rule(build_ast("d IN ('a', 'b')"), {"d": 3})
+
+    def test_cached_rule_is_compiled_once(self):
+        ast = build_ast("age > 30")
+        self.assertTrue(evaluate_rule(ast, {"age": 31}, cache_key=("test", 1)))
+        self.assertIs(get_compiled_rule(("test", 1), None), get_compiled_rule(("test", 1), ast))
+
+
+class CombineRulesTests(SimpleTestCase):
+    def test_or_of_equality_collapses_into_in(self):
+        combined = combine_rules_logic(
+            ["department = 'Sales' OR department = 'HR'", "department = 'Marketing' OR age > 30", "department = 'Ops'"],
+            "OR",
+        )
+        self.assertEqual(combined, "(department IN ('Sales', 'HR', 'Marketing', 'Ops') OR age > 30)")
+        self.assertTrue(validate_rule_string(combined))
+        self.assertTrue(evaluate_rule(build_ast(combined), {"department": "Ops", "age": 1}))
+
+    def test_and_combination_is_unchanged(self):
+        self.assertEqual(combine_rules_logic(["age > 30", "salary > 5"], "AND"), "(age > 30 AND salary > 5)")
+
+
+class DeepTreeTests(SimpleTestCase):
+    @staticmethod
+    def left_leaning(depth, operators=("AND",)):
+        """Builds the left-deep shape that rules stored before balanced parsing have."""
+        node = {"type": "operand", "value": "a = 0"}
+        for i in range(1, depth):
+            node = {"type": "operator", "value": operators[i % len(operators)], "left": node,
+                    "right": {"type": "operand", "value": f"a = {i}"}}
+        return node
+
+    # Deeper than the default recursion limit of 1000
+    def test_deep_left_leaning_chain(self):
+        ast = self.left_leaning(5000, ("OR",))
+        self.assertTrue(evaluate_rule(ast, {"a": 4999}))
+        self.assertFalse(evaluate_rule(ast, {"a": -1}))
+
+    def test_deep_alternating_tree(self):
+        # (((a = 0 OR a = 1) AND a = 2) OR a = 3) ... cannot be flattened into chains
+        ast = self.left_leaning(5000, ("AND", "OR"))
+        self.assertFalse(evaluate_rule(ast, {"a": 5}))
+        self.assertTrue(evaluate_rule(ast, {"a": 4999}))
+
+    def test_deep_trees_serialize_and_print(self):
+        ast = self.left_leaning(5000, ("AND", "OR"))
+        printed = RuleListView().json_to_ast(ast)
+        self.assertEqual(len(printed.splitlines()), 9999)
+        self.assertEqual(RuleListView().json_to_ast(ast_to_json(ast)), printed)
+        self.assertTrue(ast_to_rule_string(json_to_node(ast)).startswith("(" * 4999 + "a = 0 OR a = 1)"))
+
+    def test_deeply_parenthesized_rule(self):
+        ast = build_ast("(" * 3000 + "age > 30" + ")" * 3000)
+        self.assertEqual(ast, {"type": "operand", "value": "age > 30"})
+
+    def test_long_chains_parse_balanced(self):
+        ast = build_ast(" OR ".join(f"a = {i}" for i in range(1024)))
+        depth, node = 0, ast
+        while node["type"] == "operator":
+            depth, node = depth + 1, node["left"]
+        self.assertEqual(depth, 10)
+
+    def test_operators_apply_left_to_right(self):
+        ast = build_ast("a = 1 OR a = 2 AND b = 3")
+        self.assertFalse(evaluate_rule(ast, {"a": 1, "b": 0}))
+        self.assertTrue(evaluate_rule(ast, {"a": 2, "b": 3}))
+
+    def test_unmatched_parenthesis(self):
+        with self.assertRaises(ValueError):
+            build_ast("(age > 30 AND (salary > 5)")
+
+    def test_combining_long_alternating_chain(self):
+        # Operators apply left to right, so this is a 6000-level alternating AND/OR tree
+        rule = " OR ".join(f"a = {i} AND b = {i}" for i in range(3000))
+        combined = build_ast(combine_rules_logic([rule, "c = 1"], "OR"))
+        self.assertTrue(evaluate_rule(combined, {"a": 2999, "b": 2999}))
+        self.assertFalse(evaluate_rule(combined, {"a": 2999, "b": 0}))
+        self.assertTrue(evaluate_rule(combined, {"c": 1}))
+
+    def test_combining_many_rules(self):
+        rules = [f"(age > {i} AND department = 'D{i}') OR salary BETWEEN {i} AND {i + 10}" for i in range(10000)]
+        combined = build_ast(combine_rules_logic(rules, "OR"))
+        self.assertTrue(evaluate_rule(combined, {"age": 5, "department": "D3", "salary": -1}))
+        self.assertFalse(evaluate_rule(combined, {"age": 5, "department": "D9", "salary": -1}))
+
+
+class CliTests(SimpleTestCase):
+    def run_cli(self, *args, stdin=''):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, 'rules.json')
+            with open(snapshot, 'w') as f:
+                json.dump([{"rule_name": "adult", "rule_string": "age >= 18", "ast_json": None}], f)
+            return subprocess.run([sys.executable, '-m', 'engine.cli', '--snapshot', snapshot, *args],
+                                  cwd=settings.BASE_DIR, input=stdin, capture_output=True, text=True)
+
+    def test_snapshot_cold_start_is_within_budget_without_django(self):
+        result = self.run_cli('--timings', '--check-budget', '--data', '{"age": 20}')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("django loaded: no", result.stderr)
+        cold_start_ms = float(result.stderr.split("cold start: ", 1)[1].split(" ms", 1)[0])
+        self.assertLess(cold_start_ms, COLD_START_BUDGET_MS)
+        self.assertEqual(json.loads(result.stdout), {"adult": True})
+
+    def test_malformed_record_does_not_abort_the_batch(self):
+        result = self.run_cli(stdin='{"age": 20}\n{not json\n[1]\n5\n{"age": 5}\n')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        lines = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual(lines[0], {"adult": True})
+        self.assertEqual([set(line) for line in lines[1:4]], [{"error"}] * 3)
+        self.assertEqual(lines[4], {"adult": False})
+
+
+class RuleVersionTests(TestCase):
+    def setUp(self):
+        self.client.post(reverse('create_rule'), {'rule_name': 'adult', 'rule_string': 'age >= 18'})
+        shadow.reset_stats()
+        clear_compiled_rules()  # Rolled-back test transactions reuse rule ids
+
+    def edit(self, rule_string, shadow_mode=False):
+        data = {'rule_name': 'adult', 'rule_string': rule_string}
+        if shadow_mode:
+            data['shadow'] = 'true'
+        return self.client.post(reverse('edit_rule'), data).json()
+
+    def promote(self):
+        return self.client.post(reverse('promote_rule'), {'rule_name': 'adult'})
+
+    def test_create_stores_first_version(self):
+        rule = Rule.objects.get(rule_name='adult')
+        self.assertEqual(rule.version, 1)
+        self.assertEqual(list(rule.versions.values_list('version', flat=True)), [1])
+
+    def test_shadow_edit_keeps_active_version(self):
+        self.assertEqual(self.edit('age >= 21', shadow_mode=True), {'success': True, 'version': 2})
+        rule = Rule.objects.get(rule_name='adult')
+        self.assertEqual((rule.version, rule.rule_string, rule.shadow_version.version), (1, 'age >= 18', 2))
+
+    def test_promote_activates_candidate(self):
+        self.edit('age >= 21', shadow_mode=True)
+        response = self.promote()
+        self.assertEqual(response.json(), {'success': True, 'version': 2})
+        rule = Rule.objects.get(rule_name='adult')
+        self.assertEqual((rule.version, rule.rule_string, rule.shadow_version), (2, 'age >= 21', None))
+
+    def test_normal_edit_clears_candidate(self):
+        self.edit('age >= 21', shadow_mode=True)
+        self.assertEqual(self.edit('age >= 16'), {'success': True, 'version': 3})
+        rule = Rule.objects.get(rule_name='adult')
+        self.assertEqual((rule.version, rule.rule_string, rule.shadow_version), (3, 'age >= 16', None))
+        self.assertEqual(self.promote().status_code, 400)
+
+    def test_promote_refuses_older_candidate(self):
+        self.edit('age >= 21', shadow_mode=True)
+        # A candidate left behind by a later normal edit must not roll the rule back
+        Rule.objects.filter(rule_name='adult').update(version=3)
+        self.assertEqual(self.promote().status_code, 409)
+        self.assertEqual(Rule.objects.get(rule_name='adult').version, 3)
+
+    def test_admin_edit_stores_a_version(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        rule = Rule.objects.get(rule_name='adult')
+        url = reverse('admin:engine_rule_change', args=[rule.id])
+        self.assertTrue(evaluate_rule(rule.ast_json, {'age': 20}, cache_key=(rule.id, rule.version)))
+
+        response = self.client.post(url, {'rule_name': 'adult', 'rule_string': "age IN (1, 'a')"})
+        self.assertEqual(response.status_code, 200)  # Form redisplayed with the validation error
+        response = self.client.post(url, {'rule_name': 'adult', 'rule_string': 'age >= 21'})
+        self.assertEqual(response.status_code, 302)
+
+        rule.refresh_from_db()
+        self.assertEqual((rule.version, rule.versions.count()), (2, 2))
+        self.assertFalse(evaluate_rule(rule.ast_json, {'age': 20}, cache_key=(rule.id, rule.version)))
+
+    def test_edit_with_mixed_literal_types_is_rejected(self):
+        response = self.edit("age IN (18, 'adult')")
+        self.assertEqual(response['success'], False)
+        self.assertIn("Mixed string and numeric literals", response['message'])
+        self.assertEqual(Rule.objects.get(rule_name='adult').versions.count(), 1)
+
+    def test_shadow_evaluation_is_reported(self):
+        rule = Rule.objects.get(rule_name='adult')
+        self.edit('age >= 21', shadow_mode=True)
+        with mock.patch.object(shadow, 'get_executor', return_value=SynchronousExecutor()):
+            for age in (30, 20):
+                response = self.client.post(reverse('evaluate_rule'),
+                                            {'rules': [rule.id], 'expression': json.dumps({'age': age})})
+                self.assertEqual(response.status_code, 200)
+
+        stats = self.client.get(reverse('shadow_stats')).json()
+        self.assertEqual(stats['pending'], 0)
+        [entry] = stats['rules']
+        self.assertEqual((entry['rule_name'], entry['active_version'], entry['candidate_version']), ('adult', 1, 2))
+        self.assertEqual((entry['evaluations'], entry['divergences'], entry['candidate_errors']), (2, 1, 0))
+        for histogram in entry['latency_us'].values():
+            self.assertEqual(sum(histogram.values()), 2)
+
+    def test_shadow_errors_are_counted(self):
+        rule = Rule.objects.get(rule_name='adult')
+        self.edit("age = 'adult'", shadow_mode=True)
+        with mock.patch.object(shadow, 'get_executor', return_value=SynchronousExecutor()):
+            self.client.post(reverse('evaluate_rule'), {'rules': [rule.id], 'expression': json.dumps({'age': 30})})
+
+        [entry] = self.client.get(reverse('shadow_stats')).json()['rules']
+        self.assertEqual((entry['evaluations'], entry['candidate_errors']), (1, 1))
+
+
+class SynchronousExecutor:
+    """Runs shadow evaluations inline so tests can read the stats right after the request."""
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        pragmas = settings.DATABASE_PROFILES['production']['PRAGMAS']
+        with tempfile.TemporaryDirectory() as tmp, override_settings(SQLITE_PRAGMAS=pragmas), \
+                scratch_database('pragma_test', os.path.join(tmp, 'db.sqlite3')) as alias:
+            connections[alias].close()  # The handler runs on connection_created
+            with connections[alias].cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute("PRAGMA synchronous")
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_db_loadtest_reports_each_profile(self):
+        out = StringIO()
+        call_command('db_loadtest', '--duration', '0.2', '--readers', '2', '--writers', '1', '--rules', '5', stdout=out)
+        rows = out.getvalue().splitlines()[1:]
+        self.assertEqual([row.split()[0] for row in rows], list(settings.DATABASE_PROFILES))
+
+
+class HttpLoadTestTests(SimpleTestCase):
+    def test_smoke_run_reports_every_endpoint(self):
+        out = StringIO()
+        call_command('http_loadtest', '--rules', '5', '--requests', '5', '--servers', 'wsgi',
+                     '--rules-per-request', '2', '--warmup', '1', '--concurrency', '2', stdout=out)
+        rows = out.getvalue().splitlines()[3:]
+        self.assertEqual([" ".join(row.split()[:2]) for row in rows], [
+            'GET rule_list', 'GET evaluate_rule', 'POST evaluate_rule', 'GET combine_rules', 'POST combine_rules',
+        ])
+        self.assertEqual([row.split()[-1] for row in rows], ['0'] * 5)
+        self.assertNotIn('http_loadtest', connections.databases)
@@ -9,4 +9,6 @@ urlpatterns = [
     path('evaluate-rules/', views.EvaluateRuleView.as_view(), name='evaluate_rule'),
      path('save-combined-rule/', views.SaveCombinedRuleView.as_view(), name='save_combined_rule'),
      path('rules/edit/', views.EditRuleView.as_view(), name='edit_rule'),
+     path('rules/promote/', views.PromoteRuleView.as_view(), name='promote_rule'),
+     path('shadow-stats/', views.ShadowStatsView.as_view(), name='shadow_stats'),
 ]
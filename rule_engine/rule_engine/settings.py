@@ -75,13 +75,53 @@ WSGI_APPLICATION = 'rule_engine.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
+# Database performance profiles, selected with the RULE_ENGINE_DB_PROFILE
+# environment variable. 'default' is Django's stock sqlite3 behaviour and leaves
+# the checked-in db.sqlite3 untouched; deployments opt into 'production', which
+# enables WAL, persistent connections and a busy timeout so that concurrent rule
+# edits and evaluations do not fail with "database is locked".
+# PRAGMAS are applied to every new SQLite connection (see engine/signals.py).
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+        'PRAGMAS': {},
+    },
+    'production': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'timeout': 20},  # seconds to wait on a locked database
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+        },
+    },
+}
+
+DATABASE_PROFILE = os.environ.get('RULE_ENGINE_DB_PROFILE', 'default')
+if DATABASE_PROFILE not in DATABASE_PROFILES:
+    raise ValueError(f"Unknown RULE_ENGINE_DB_PROFILE: '{DATABASE_PROFILE}'")
+
+DATABASES = {
+    'default': {
+        'ENGINE': DATABASE_PROFILES[DATABASE_PROFILE]['ENGINE'],
+        'NAME': os.environ.get('RULE_ENGINE_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': DATABASE_PROFILES[DATABASE_PROFILE]['CONN_MAX_AGE'],
+        'OPTIONS': DATABASE_PROFILES[DATABASE_PROFILE]['OPTIONS'],
     }
 }
 
+SQLITE_PRAGMAS = DATABASE_PROFILES[DATABASE_PROFILE]['PRAGMAS']
+
+
+# Shadow evaluation of candidate rule versions (see engine/shadow.py)
+
+RULE_SHADOW_WORKERS = 2
+
+RULE_SHADOW_MAX_PENDING = 1000  # Shadow evaluations beyond this backlog are dropped and counted
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators